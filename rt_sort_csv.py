@@ -27,17 +27,21 @@ the indexes to use will be determined from the header line. Depending on the
 header line content, it is possible to fail while attempting to determine the
 indexes.
 
-Note that the rows are currently sorted using lexicographic comparisons.
-The compared strings are created using padding to ensure that various
-fields in the sort all compare correctly, and the frequencies in the file
-exported by my RT Systems programmer all have the same length, making a
-lexicographic comparison equivalent to a numeric comparison. Your mileage
-may vary, as I have no idea if *every* RT Systems radio programmer exports
-csv with the frequencies padded to the same length.
+Note that the sort field is compared numerically when it holds a number,
+so frequencies sort correctly whether or not the programmer pads them to the
+same length. Fields that are not numbers sort after all numeric fields,
+ordered lexicographically, which allows sorting on text fields as well.
+
+Only the standard library is used, so the script also runs unchanged under
+PyPy, whose JIT speeds up the per-row filtering and key construction on very
+large exports:
+
+    pypy3 rt_sort_csv.py input.csv output.csv
 
 usage: rt_sort_csv.py [-h]
                       [--sortfield SORTFIELD]
                       [--namefield NAMEFIELD]
+                      [--fast-parse]
                       input output
 
 positional arguments:
@@ -50,12 +54,15 @@ optional arguments:
                         The field index to use for sorting.
   --namefield NAMEFIELD
                         The field index to use for the channel name.
+  --fast-parse          Split unquoted input on commas and join output
+                        fields with commas instead of using the csv module,
+                        falling back to the csv module if the data is not
+                        simple enough.
 """
 
 import csv as csv
 import sys as sys
 import argparse as ap
-import functools as ft
 
 
 # Argument parsing related constants
@@ -63,10 +70,20 @@ _ARG_INPUT = 'input'
 _ARG_OUTPUT = 'output'
 _ARG_SORT_FIELD = '--sortfield'
 _ARG_NAME_FIELD = '--namefield'
+_ARG_FAST_PARSE = '--fast-parse'
 _HELP_INPUT = 'The input .csv file name.'
 _HELP_OUTPUT = 'The output .csv file name.'
 _HELP_SORT_FIELD = 'The field index to use for sorting.'
 _HELP_NAME_FIELD = 'The field index to use for the channel name.'
+_HELP_FAST_PARSE = ('Split unquoted input on commas and join output '
+                    'fields with commas instead of using the csv module, '
+                    'falling back to the csv module if the data is not '
+                    'simple enough.')
+
+# Buffer size used when reading and writing csv files. Exported channel
+# lists are read and written in one pass, so a large buffer keeps the number
+# of read and write system calls down.
+_IO_BUFFER_SIZE = 1 << 20
 
 # List of header fields for detection of sort and name fields.
 # This is done this way so it will be easy to support other programmers if
@@ -75,71 +92,53 @@ _HELP_NAME_FIELD = 'The field index to use for the channel name.'
 _SORT_FIELDS = ['Receive Frequency']
 _NAME_FIELDS = ['Name']
 
-# List of specially-handled radio services that use channels.
+# Set of specially-handled radio services that use channels.
 # I own a couple of FRS radios and want to be able to listen to those
 # frequencies on my amateur radio HT.
 # Channels named 'FRS/GMRS X', where X is a number, will go to the end of the
 # list, ordered by the channel number X
 # This is written to be able to extend to other radio services just by adding on
-# to this list, in which case the channels for a given service would end up
+# to this set, in which case the channels for a given service would end up
 # together, with the blocks for the services in alphabetical order.
-_CHANNEL_SERVICES = ['FRS/GMRS']
-
-
-@ft.total_ordering
-class CSVRecord:
-    """A CSVRecord represents a single row in a CSV file.
+_CHANNEL_SERVICES = frozenset(['FRS/GMRS'])
 
-    A total ordering is implemented so that records can be sorted by fields,
-    with the sort field specified by CSVRecord.sortfield
-    """
-    sort_field = 1
-    name_field = 7
-
-    def __init__(self, fields):
-        self._fields = fields
-        name_words = self._fields[self.name_field].split(' ')
-        if len(name_words) > 1 and name_words[0] in _CHANNEL_SERVICES:
-            self._service_name = name_words[0]
-            self._service_channel = int(name_words[1])
-        else:
-            self._service_name = ''
-            self._service_channel = 0
-
-    def __repr__(self):
-        return str(self._fields)
+# Sort rank of each channel service, in alphabetical order of service name.
+# Channels that are not part of a service get rank -1, placing them first.
+_SERVICE_RANK = {name: rank
+                 for rank, name in enumerate(sorted(_CHANNEL_SERVICES))}
+_NO_SERVICE_RANK = -1
 
-    def __eq__(self, other) -> bool:
-        return isinstance(other, CSVRecord)\
-               and self._service_name == other._service_name\
-               and self._service_channel == other._service_channel\
-               and self._fields == other._fields
 
-    def __lt__(self, other) -> bool:
-        if isinstance(other, CSVRecord):
-            return self._lexicographic_value() < other._lexicographic_value()
-        return False
+def _channel_service(name):
+    """Determine the (rank, channel) pair used to group a channel name.
 
-    def __iter__(self):
-        return self._fields.__iter__()
+    Names of the form 'SERVICE X', where SERVICE is one of _CHANNEL_SERVICES
+    and X is a number, produce (_SERVICE_RANK[SERVICE], X). Any other name,
+    including a service name followed by something other than a number,
+    produces (_NO_SERVICE_RANK, 0), so those channels sort ahead of the
+    specially-handled services.
+    """
+    service, separator, rest = name.partition(' ')
+    rank = _SERVICE_RANK.get(service, _NO_SERVICE_RANK)
+    if separator and rank != _NO_SERVICE_RANK:
+        try:
+            return rank, int(rest.partition(' ')[0])
+        except ValueError:
+            pass
+    return _NO_SERVICE_RANK, 0
 
-    def _lexicographic_value(self):
-        """Convert to a string appropriate for a lexicographic comparison."""
-        name = self._service_name
-        channel = self._service_channel
-        field = self._fields[self.sort_field]
-        return f'{name:16}{channel:02}{field:9}'
 
-    def has_data(self):
-        """Determine if a record has data required in the output."""
-        for field in self._fields[1:]:
-            if field is not '':
-                return True
-        return False
+def _numeric_value(field):
+    """Convert a sort field to a number for comparison.
 
-    def set_index(self, value):
-        """Set the record index (first) field to the given value."""
-        self._fields[0] = str(value + 1)
+    Fields that are not numbers convert to infinity, so that they sort after
+    every numeric field and are then ordered by the field text.
+    """
+    try:
+        value = float(field)
+    except ValueError:
+        return float('inf')
+    return value if value == value else float('inf')
 
 
 def _create_parser():
@@ -151,6 +150,8 @@ def _create_parser():
                         default=-1, help=_HELP_SORT_FIELD)
     parser.add_argument(_ARG_NAME_FIELD, type=int,
                         default=-1, help=_HELP_NAME_FIELD)
+    parser.add_argument(_ARG_FAST_PARSE, action='store_true',
+                        help=_HELP_FAST_PARSE)
     return parser
 
 
@@ -170,50 +171,120 @@ def _field_index(header, field_names, index):
     """Determine a field index.
 
     If the index passed is already a valid index, that index is returned.
-    Otherwise, the header is searched for a field name matching any of
-    the passed field names, and the index of the first one found is
-    returned.
+    Otherwise, the passed field names are looked up in the header in order,
+    and the index of the first one found is returned. If a name appears in
+    the header more than once, its first occurrence is used.
 
     If no matching field can be found, a ValueError is raised.
     """
     if index > -1:
         return index
+    header_indexes = {}
     for index, value in enumerate(header):
-        if value in field_names:
+        header_indexes.setdefault(value, index)
+    for value in field_names:
+        if value in header_indexes:
+            index = header_indexes[value]
             print(f'Detected field \'{value}\' at index {index}')
             return index
     expected_names = ', '.join(field_names)
     raise ValueError(f'No header field is named any of {expected_names}')
 
 
-def _process_input(filename, sort_field, name_field):
+def _fast_parse_rows(text):
+    """Split csv text into rows without using the csv module.
+
+    This only handles the simple case of unquoted fields separated by commas.
+    If the text contains any quotes, or the non-empty rows do not all have
+    the same number of fields, None is returned and the text should be parsed
+    with the csv module instead.
+
+    Like csv.reader, only '\r', '\n' and '\r\n' end a line, and an empty
+    line produces an empty row.
+    """
+    if '"' in text:
+        return None
+    lines = text.replace('\r\n', '\n').replace('\r', '\n').split('\n')
+    if lines[-1] == '':
+        lines.pop()
+    rows = [line.split(',') if line else [] for line in lines]
+    field_counts = {len(row) for row in rows if row}
+    if len(field_counts) > 1:
+        return None
+    return rows
+
+
+def _fast_join_rows(rows):
+    """Join rows into csv lines without using the csv module.
+
+    The lines match what csv.writer would produce, as long as no field needs
+    quoting. If any field contains a comma, quote, or line break, None is
+    returned and the rows should be written with csv.writer instead.
+    """
+    lines = []
+    for row in rows:
+        line = ','.join(row)
+        if ('"' in line or '\r' in line or '\n' in line
+                or line.count(',') != len(row) - 1):
+            return None
+        lines.append(line + '\r\n')
+    return lines
+
+
+def _process_input(filename, sort_field, name_field, fast_parse=False):
     """Read, filter, and sort the input file specified by the arguments."""
     print(f'Reading data from {filename}')
-    with open(filename, newline='') as infile:
-        csv_reader = csv.reader(infile)
-        csv_rows = list(csv_reader)
-        header = CSVRecord(csv_rows[0])
-        CSVRecord.sort_field = _field_index(header, _SORT_FIELDS, sort_field)
-        CSVRecord.name_field = _field_index(header, _NAME_FIELDS, name_field)
-        rows = sorted(filter(lambda r: r.has_data(), map(CSVRecord, csv_rows[1:])))
-        return header, rows
+    with open(filename, newline='', buffering=_IO_BUFFER_SIZE) as infile:
+        fast_rows = None
+        if fast_parse:
+            fast_rows = _fast_parse_rows(infile.read())
+            if fast_rows is None:
+                print('Input is not simple enough to fast parse, using csv')
+                infile.seek(0)
+        if fast_rows is None:
+            row_reader = csv.reader(infile)
+        else:
+            row_reader = iter(fast_rows)
+        header = next(row_reader, None)
+        if header is None:
+            raise ValueError(f'No header line found in {filename}')
+        rows = [row for row in row_reader if any(row[1:])]
+    sort_field = _field_index(header, _SORT_FIELDS, sort_field)
+    name_field = _field_index(header, _NAME_FIELDS, name_field)
+
+    # The indexes are bound as default arguments so lookups are local.
+    def sort_key(row, sort_field=sort_field, name_field=name_field):
+        field = row[sort_field]
+        service_channel = _channel_service(row[name_field])
+        return service_channel + (_numeric_value(field), field)
 
+    rows.sort(key=sort_key)
+    return header, rows
 
-def _write_output(filename, header, rows):
+
+def _write_output(filename, header, rows, fast_write=False):
     """Write the header and rows to the output file.
 
-    The rows will be renumbered as they are written.
+    The rows will be renumbered as they are written. If fast_write is set,
+    the rows are joined without the csv module when none of them need
+    quoting.
     """
-    with open(filename, 'w', newline='') as outfile:
-        csv_writer = csv.writer(outfile)
-        csv_writer.writerow(header)
-        for index, row in enumerate(rows):
-            row.set_index(index)
-            csv_writer.writerow(row)
+    for label, row in zip(map(str, range(1, len(rows) + 1)), rows):
+        row[0] = label
+    lines = _fast_join_rows([header, *rows]) if fast_write else None
+    with open(filename, 'w', newline='',
+              buffering=_IO_BUFFER_SIZE) as outfile:
+        if lines is None:
+            csv_writer = csv.writer(outfile)
+            csv_writer.writerow(header)
+            csv_writer.writerows(rows)
+        else:
+            outfile.writelines(lines)
     print(f'Wrote data to {filename}')
 
 
 if __name__ == "__main__":
     _args = _parse_args()
-    _header, _rows = _process_input(_args.input, _args.sortfield, _args.namefield)
-    _write_output(_args.output, _header, _rows)
+    _header, _rows = _process_input(_args.input, _args.sortfield,
+                                    _args.namefield, _args.fast_parse)
+    _write_output(_args.output, _header, _rows, _args.fast_parse)